@@ -1,346 +1,663 @@
 import streamlit as st
 import pandas as pd
-import psycopg2
+from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from psycopg2.extras import execute_values
+from psycopg2.extensions import connection as pg_connection
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 import os
+import re
+from urllib.parse import urlparse
 import hashlib
+import hmac
 import time
 import uuid
+import logging
+import threading
 from streamlit import cache_data
 from supabase import create_client, Client
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 
 # --- CONFIGURATION & SETUP ---
+log = logging.getLogger(__name__)
 # We no longer use a local UPLOAD_DIR because Streamlit Cloud deletes it.
 
 # --- SUPABASE STORAGE CONNECTION ---
+@st.cache_resource
+def get_supabase_client():
+    """One Supabase client (and its HTTP session) per server process, shared by every upload"""
+    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+
 def init_supabase():
     """Initialize Supabase Client for Storage"""
-    # Try getting secrets from Streamlit's secret manager
+    # Try getting secrets from Streamlit's secret manager; a failure isn't cached, so fixed secrets are picked up
     try:
-        url = st.secrets["SUPABASE_URL"]
-        key = st.secrets["SUPABASE_KEY"]
-        return create_client(url, key)
+        return get_supabase_client()
     except Exception as e:
         st.error("❌ Supabase Secrets missing! Add SUPABASE_URL and SUPABASE_KEY to .streamlit/secrets.toml")
         st.stop()
 
 # --- FILE UPLOAD HELPER ---
-def upload_file_to_supabase(uploaded_file):
-    """Uploads a file to Supabase Storage and returns the Public URL"""
-    if not uploaded_file:
-        return None
-    
-    supabase = init_supabase()
-    bucket_name = "task-files"
-    
-    # Create a unique filename (uuid) so files don't overwrite each other
-    file_ext = os.path.splitext(uploaded_file.name)[1]
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    
+def store_file(file_bytes, file_name, content_type):
+    """Uploads bytes to Supabase Storage and returns the Public URL; raises on failure, touches no UI"""
+    bucket = get_supabase_client().storage.from_("task-files")
+    # Create a unique filename (uuid) so files don't overwrite each other; random names also keep the
+    # public URL unguessable (a content hash would let anyone holding the file compute its URL)
+    unique_filename = f"{uuid.uuid4()}{os.path.splitext(file_name)[1]}"
+    # Upload to Supabase Bucket
+    bucket.upload(path=unique_filename, file=file_bytes, file_options={"content-type": content_type})
+    # Get the Public URL so anyone with the link can view it
+    return bucket.get_public_url(unique_filename)
+
+@st.cache_resource
+def get_upload_executor():
+    """Shared worker threads for attachment uploads, so saving a task doesn't wait on the HTTPS upload"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="upload")
+
+@st.cache_resource
+def get_upload_failures():
+    """({session token: [message, ...]}, lock): filled by upload threads, drained (and toasted) on that session's
+    next rerun; the lock lives in the cached resource because module-level state is rebuilt on every rerun"""
+    return {}, threading.Lock()
+
+def _attach_file(task_id, seq, session_token, file_bytes, file_name, content_type):
+    # Runs on an upload thread: no Streamlit UI here, the tasks trigger bumps the cache version on UPDATE
     try:
-        file_bytes = uploaded_file.getvalue()
-        # Upload to Supabase Bucket
-        supabase.storage.from_(bucket_name).upload(
-            path=unique_filename, 
-            file=file_bytes, 
-            file_options={"content-type": uploaded_file.type}
-        )
-        # Get the Public URL so anyone with the link can view it
-        public_url = supabase.storage.from_(bucket_name).get_public_url(unique_filename)
-        return public_url
-    except Exception as e:
-        st.error(f"Upload Failed: {e}")
-        return None
+        url = store_file(file_bytes, file_name, content_type)
+        with db_cursor() as c:
+            # Uploads finish in any order: only the most recently queued file for a task may land
+            c.execute("""UPDATE tasks SET file_path = %s, file_seq = %s
+                         WHERE id = %s AND (file_seq IS NULL OR file_seq < %s)""", (url, seq, task_id, seq))
+    except Exception:
+        log.exception("Attachment upload for task %s failed", task_id)
+        failures, lock = get_upload_failures()
+        with lock:
+            failures.setdefault(session_token, []).append(f"⚠️ Upload of {file_name} failed; attach it again.")
+
+def attach_file_later(task_id, uploaded_file):
+    """Queues the upload; the bytes are read now because the UploadedFile doesn't outlive the rerun"""
+    init_supabase()
+    session_token = st.session_state.setdefault('upload_token', uuid.uuid4().hex)
+    # Queue-time sequence, so a slower older upload can't overwrite a newer one for the same task
+    get_upload_executor().submit(_attach_file, task_id, time.time_ns(), session_token,
+                                 uploaded_file.getvalue(), uploaded_file.name, uploaded_file.type)
+
+def toast_upload_failures():
+    token = st.session_state.get('upload_token')
+    if not token: return
+    failures, lock = get_upload_failures()
+    with lock:
+        messages = failures.pop(token, [])
+    for message in messages: st.toast(message)
 
 # --- DATABASE CONNECTION ---
-def get_db_connection():
+class PooledConnection(pg_connection):
+    """psycopg2 connection that remembers which PREPAREd statements it already holds"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+# Shared by every session's reruns and the upload workers; getconn() raises instead of waiting when the pool is
+# empty, so db_connection queues on a semaphore of POOL_MAX permits for up to POOL_WAIT seconds first
+POOL_MAX = 10
+POOL_WAIT = 10
+
+@st.cache_resource
+def get_pool():
+    """One pool per server process, so reruns reuse open connections instead of reconnecting"""
     try:
-        return psycopg2.connect(st.secrets["DB_URL"])
+        # DB_URL from the environment (e.g. the Docker image) wins over .streamlit/secrets.toml
+        dsn = os.getenv("DB_URL") or st.secrets["DB_URL"]
+        pool = ThreadedConnectionPool(1, POOL_MAX, dsn, connection_factory=PooledConnection)
+        pool.slots = threading.BoundedSemaphore(POOL_MAX)
+        pool.use_prepared = prepared_statements_enabled(dsn)
+        return pool
     except Exception as e:
         st.error(f"❌ Database Connection Error: {e}")
         st.stop()
 
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection; commits on success, rolls back on error, always returns it"""
+    pool = get_pool()
+    # Wait briefly for a free connection rather than failing the rerun (or a finished upload) outright
+    if not pool.slots.acquire(timeout=POOL_WAIT):
+        raise PoolError(f"no database connection free after {POOL_WAIT}s")
+    try:
+        conn = pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            # Drop dead connections instead of handing them to the next caller
+            pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        pool.slots.release()
+
+@contextmanager
+def db_cursor():
+    with db_connection() as conn:
+        with conn.cursor() as c:
+            yield c
+
+# Hot statements run on (nearly) every rerun. On a direct/session connection each pooled connection
+# can parse/plan them once with PREPARE; behind a transaction-mode pooler (Supabase's :6543 pooler,
+# pgbouncer) consecutive transactions may land on different backends, so they run as plain SQL there.
+def prepared_statements_enabled(dsn):
+    """DB_PREPARE=1/0 forces it; otherwise PREPARE only when DB_URL isn't a :6543 / pooler host"""
+    setting = os.getenv("DB_PREPARE")
+    if setting is not None: return setting == "1"
+    return not re.search(r"(:|port=)6543\b|pooler", dsn)
+
+PREPARED_STATEMENTS = {
+    "session_state": """SELECT ARRAY(SELECT username FROM users WHERE last_active > $1),
+                               COALESCE((SELECT version FROM cache_versions WHERE name = 'tasks'), 0),
+                               COALESCE((SELECT version FROM cache_versions WHERE name = 'refs'), 0)""",
+    "user_by_name": "SELECT username, password, role FROM users WHERE username = $1",
+    "touch_user": "UPDATE users SET last_active = $1, password = COALESCE($2, password) WHERE username = $3",
+    "delete_task": "DELETE FROM tasks WHERE id = $1",
+    "update_task": """UPDATE tasks SET status = $1, completed_items = $2, description = $3,
+                                       task_link = COALESCE($4, task_link) WHERE id = $5""",
+}
+
+# Sent ahead of a statement in the same round-trip: the commit doesn't wait for the WAL flush. A crash can
+# lose the last few hundred ms of such writes but never corrupts anything, so it's only for disposable data.
+ASYNC_COMMIT = "SET LOCAL synchronous_commit TO OFF; "
+
+def execute_prepared(c, name, params, async_commit=False):
+    """EXECUTE a statement from PREPARED_STATEMENTS, PREPAREing it the first time this connection sees it"""
+    execute_prepared_many(c, [(name, params)], async_commit)
+
+def execute_prepared_many(c, calls, async_commit=False):
+    """Runs [(name, params), ...] from PREPARED_STATEMENTS in one round-trip; the cursor holds the last result"""
+    parts = [ASYNC_COMMIT] if async_commit else []
+    args = []
+    use_prepared = get_pool().use_prepared
+    for name, params in calls:
+        stmt = PREPARED_STATEMENTS[name]
+        if not use_prepared:
+            # Same SQL, plain parameters: $n -> %s (every statement uses its placeholders in order)
+            for i in range(len(params), 0, -1): stmt = stmt.replace(f"${i}", "%s")
+            parts.append(stmt + "; ")
+        else:
+            conn = c.connection
+            # Prepared statements are session state, not transactional, so they outlive commits/rollbacks
+            if name not in conn.prepared:
+                c.execute(f"PREPARE {name} AS {stmt}"); conn.prepared.add(name)
+            parts.append(f"EXECUTE {name} ({', '.join(['%s'] * len(params))}); ")
+        args.extend(params)
+    c.execute("".join(parts), args)
+
 # --- SECURITY UTILS ---
+# Argon2id with OWASP interactive parameters (64 MiB, 3 passes, 2 lanes); built once per process
+PH = PasswordHasher(memory_cost=65536, time_cost=3, parallelism=2)
+
+@st.cache_resource
+def get_dummy_hash():
+    """Verified against when the username doesn't exist, so unknown users cost the same Argon2 work as wrong passwords"""
+    return PH.hash(os.urandom(16).hex())
+
 def make_hashes(password):
-    return hashlib.sha256(str.encode(password)).hexdigest()
+    return PH.hash(password)
 
 def check_hashes(password, hashed_text):
-    if make_hashes(password) == hashed_text:
-        return hashed_text
-    return False
+    """Verifies against Argon2 hashes, falling back to the legacy unsalted SHA-256 format"""
+    if not hashed_text: return False
+    if hashed_text.startswith("$argon2"):
+        try: return PH.verify(hashed_text, password)
+        except (VerificationError, InvalidHashError): return False
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(legacy, hashed_text)
+
+def needs_rehash(hashed_text):
+    return not hashed_text.startswith("$argon2") or PH.check_needs_rehash(hashed_text)
 
 # --- CACHE DATA ---
-@st.cache_data(ttl=60) 
-def get_tasks(include_archived=False):
-    conn = get_db_connection()
-    query = "SELECT * FROM tasks" if include_archived else "SELECT * FROM tasks WHERE is_archived = 0"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+TASK_COLUMNS = ["id", "task_name", "department", "assignee", "status", "deadline",
+                "total_items", "completed_items", "description", "file_path", "task_link", "progress"]
+
+def task_filter_sql(include_archived=False, username=None, statuses=None):
+    """Shared WHERE clause (alias t) for every task read, so lists and aggregates always agree"""
+    where, params = "TRUE", []
+    if not include_archived: where += " AND t.is_archived = 0"
+    if username:
+        where += " AND EXISTS (SELECT 1 FROM task_assignees ta WHERE ta.task_id = t.id AND ta.username = %s)"
+        params.append(username)
+    if statuses is not None:
+        where += " AND t.status = ANY(%s)"; params.append(list(statuses))
+    return where, params
+
+WORKSPACE_PAGE_SIZE = 25
+# The dashboard list only shows these, so it doesn't pull descriptions/links for every row
+DASHBOARD_COLUMNS = ("task_name", "department", "status", "deadline", "completed_items")
+
+# No TTL: entries are keyed on the tasks version (see get_session_bundle), so they're exact until the next write and never refetched early
+@st.cache_data(max_entries=64)
+def get_tasks(include_archived=False, username=None, limit=None, version=0, statuses=None, offset=0, columns=None):
+    """Active (or all) tasks, filtered and paged in SQL; username limits to that user's tasks, statuses to those statuses,
+    columns (a tuple from TASK_COLUMNS) to just the columns the caller shows"""
+    columns = list(columns or TASK_COLUMNS)
+    if not set(columns) <= set(TASK_COLUMNS): raise ValueError(f"Unknown task columns: {columns}")
+    where, params = task_filter_sql(include_archived, username, statuses)
+    query = f"""SELECT {', '.join('t.' + col for col in columns)}
+                FROM tasks t WHERE {where} ORDER BY t.deadline, t.id"""
+    if limit:
+        query += " LIMIT %s OFFSET %s"; params += [limit, offset]
+    with db_connection() as conn:
+        # A LIMITed page comes back in one round-trip on a client cursor; only the unbounded fetch uses a
+        # named (server-side) cursor, streaming in batches instead of buffering the whole result client-side
+        with (conn.cursor() if limit else conn.cursor(name="tasks_cur")) as c:
+            if not limit: c.itersize = 2000
+            c.execute(query, tuple(params))
+            df = pd.DataFrame.from_records(c.fetchall() if limit else list(c), columns=columns)
+    # datetime64 once per fetch (cached) so deadline comparisons downstream stay vectorized
+    if 'deadline' in df: df['deadline'] = pd.to_datetime(df['deadline'])
     return df
 
-# --- HELPER: DATE CALCULATOR ---
-def get_next_schedule_date(start_date, frequency, days_list_str=None):
-    if frequency == "Daily":
-        return start_date + timedelta(days=1)
-    elif frequency == "Weekly":
-        return start_date + timedelta(weeks=1)
-    elif frequency == "Monthly":
-        return start_date + timedelta(days=30)
-    elif frequency == "Specific Days" and days_list_str:
-        day_map = {"Mon": 0, "Tue": 1, "Wed": 2, "Thu": 3, "Fri": 4, "Sat": 5, "Sun": 6}
-        target_days = sorted([day_map[d] for d in days_list_str.split(',') if d in day_map])
-        if not target_days: return start_date + timedelta(days=1) 
-        current_weekday = start_date.weekday()
-        for day_idx in target_days:
-            if day_idx > current_weekday:
-                return start_date + timedelta(days=(day_idx - current_weekday))
-        days_ahead = (6 - current_weekday) + 1 + target_days[0]
-        return start_date + timedelta(days=days_ahead)
-    return start_date + timedelta(days=1)
+@st.cache_data(max_entries=64)
+def get_task_counts(include_archived=False, username=None, version=0, today=None):
+    """Dashboard metric + chart data as {'department'|'status'|'assignee'|'overdue': Series}, grouped
+    server-side in one query; today is the overdue cutoff (and part of the cache key, so it rolls over at midnight)"""
+    where, params = task_filter_sql(include_archived, username)
+    with db_cursor() as c:
+        c.execute(f"""SELECT 'department', t.department, count(*) FROM tasks t WHERE {where} GROUP BY t.department
+                      UNION ALL
+                      SELECT 'status', t.status, count(*) FROM tasks t WHERE {where} GROUP BY t.status
+                      UNION ALL
+                      SELECT 'assignee', a.username, count(*) FROM tasks t
+                      JOIN task_assignees a ON a.task_id = t.id WHERE {where} GROUP BY a.username
+                      UNION ALL
+                      SELECT 'overdue', 'overdue', count(*) FROM tasks t
+                      WHERE {where} AND t.status IS DISTINCT FROM 'Done' AND t.deadline < %s""",
+                  tuple(params * 4 + [today or date.today()]))
+        rows = c.fetchall()
+    counts = {dim: {} for dim in ('department', 'status', 'assignee', 'overdue')}
+    for dim, key, n in rows: counts[dim][key] = n
+    return {dim: pd.Series(vals, dtype='int64').sort_values(ascending=False) for dim, vals in counts.items()}
+
+def clear_task_caches():
+    # The version bump already invalidates; clearing just drops the superseded entries right away
+    get_tasks.clear(); get_task_counts.clear()
 
 # --- DATABASE FUNCTIONS ---
+# Every table/index/function init_db creates; if all of them exist the DDL batch is skipped entirely
+SCHEMA_RELATIONS = ["tasks", "users", "departments", "statuses", "recurring_templates",
+                    "task_assignees", "ix_task_assignees_user", "ix_tasks_archive", "cache_versions",
+                    "ix_recurring_next_run", "ix_tasks_active_deadline", "ix_users_online"]
+SCHEMA_FUNCTIONS = ["next_schedule_date(date, text, text)", "bump_cache_version()"]
+# Stamped on cache_versions by the DDL; bump it whenever a function body changes, since the probe only sees names
+SCHEMA_VERSION = "schema v4"
+
+SCHEMA_DDL = '''
+    CREATE TABLE IF NOT EXISTS tasks (
+        id SERIAL PRIMARY KEY,
+        task_name TEXT,
+        department TEXT,
+        assignee TEXT,
+        status TEXT,
+        deadline DATE,
+        total_items INTEGER,
+        completed_items INTEGER,
+        description TEXT, 
+        file_path TEXT, 
+        task_link TEXT,
+        is_archived INTEGER DEFAULT 0
+    );
+    -- Migration for tables created before description existed; a no-op (no error, no rollback) otherwise
+    ALTER TABLE tasks ADD COLUMN IF NOT EXISTS description TEXT;
+    -- Queue-time sequence of the attachment in file_path; background uploads only replace an older one
+    ALTER TABLE tasks ADD COLUMN IF NOT EXISTS file_seq BIGINT;
+    -- Card progress (0-100) kept by Postgres on every write, so reads never recompute it
+    ALTER TABLE tasks ADD COLUMN IF NOT EXISTS progress INTEGER GENERATED ALWAYS AS (
+        CASE WHEN total_items > 0 THEN LEAST(GREATEST(COALESCE(completed_items, 0) * 100 / total_items, 0), 100) ELSE 0 END
+    ) STORED;
+
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT,
+        role TEXT,
+        last_active TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS departments (name TEXT PRIMARY KEY);
+    CREATE TABLE IF NOT EXISTS statuses (name TEXT PRIMARY KEY);
+
+    CREATE TABLE IF NOT EXISTS recurring_templates (
+        id SERIAL PRIMARY KEY,
+        task_name TEXT,
+        department TEXT,
+        assignee TEXT,
+        frequency TEXT,
+        days_of_week TEXT, 
+        next_run_date DATE,
+        total_items INTEGER,
+        description TEXT,
+        task_link TEXT,
+        end_date DATE
+    );
+    -- Optional last occurrence; older databases get the column here
+    ALTER TABLE recurring_templates ADD COLUMN IF NOT EXISTS end_date DATE;
+    -- The daily generator only looks at due templates, so index the due date
+    CREATE INDEX IF NOT EXISTS ix_recurring_next_run ON recurring_templates (next_run_date);
+
+    -- Assignees as rows instead of a CSV column, so "my tasks" is an indexed lookup
+    CREATE TABLE IF NOT EXISTS task_assignees (
+        task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+        username TEXT,
+        PRIMARY KEY (task_id, username)
+    );
+    CREATE INDEX IF NOT EXISTS ix_task_assignees_user ON task_assignees (username);
+
+    -- Backfill tasks created before the junction table existed
+    INSERT INTO task_assignees (task_id, username)
+    SELECT DISTINCT t.id, btrim(a.name)
+    FROM tasks t, unnest(string_to_array(t.assignee, ',')) AS a(name)
+    WHERE btrim(a.name) <> ''
+      AND NOT EXISTS (SELECT 1 FROM task_assignees ta WHERE ta.task_id = t.id);
+
+    -- Partial index so the auto-archive scan only walks unarchived rows
+    CREATE INDEX IF NOT EXISTS ix_tasks_archive ON tasks (status, deadline) WHERE is_archived = 0;
+    -- Matches get_tasks' ORDER BY deadline, id on the default (unarchived) view, so a LIMIT/OFFSET page
+    -- reads rows in index order instead of sorting every active task
+    CREATE INDEX IF NOT EXISTS ix_tasks_active_deadline ON tasks (deadline, id) WHERE is_archived = 0;
+    -- Online-users range scan in the per-rerun session query; INCLUDE makes it index-only
+    DROP INDEX IF EXISTS ix_users_last_active;
+    CREATE INDEX IF NOT EXISTS ix_users_online ON users (last_active) INCLUDE (username);
+
+    -- Recurrence date calculator, kept in SQL so templates can be advanced set-based.
+    -- Specific Days: next listed weekday strictly after start_date (ISODOW Mon=1..Sun=7), wrapping to next week.
+    CREATE OR REPLACE FUNCTION next_schedule_date(start_date DATE, frequency TEXT, days_list TEXT)
+    RETURNS DATE LANGUAGE sql IMMUTABLE AS $$
+        -- Calendar months, not 30 days: date + interval clamps to the month's last day (Jan 31 -> Feb 28)
+        SELECT CASE WHEN frequency = 'Monthly' THEN (start_date + interval '1 month')::date
+        ELSE start_date + CASE frequency
+            WHEN 'Daily' THEN 1
+            WHEN 'Weekly' THEN 7
+            WHEN 'Specific Days' THEN COALESCE((
+                SELECT min((array_position(ARRAY['Mon','Tue','Wed','Thu','Fri','Sat','Sun'], d)
+                            - EXTRACT(ISODOW FROM start_date)::int + 6) %% 7 + 1)
+                FROM unnest(string_to_array(days_list, ',')) AS d
+                WHERE array_position(ARRAY['Mon','Tue','Wed','Thu','Fri','Sat','Sun'], d) IS NOT NULL), 1)
+            ELSE 1
+        END END
+    $$;
+
+    -- Cache version counters: any write (from any session) bumps the matching row, so cached reads
+    -- are keyed on the version instead of expiring on a timer. 'tasks' covers tasks + assignees,
+    -- 'refs' covers the sidebar lists (users only on INSERT/DELETE; last_active stamps don't count).
+    CREATE TABLE IF NOT EXISTS cache_versions (name TEXT PRIMARY KEY, version BIGINT NOT NULL DEFAULT 0);
+    INSERT INTO cache_versions (name) VALUES ('tasks'), ('refs') ON CONFLICT DO NOTHING;
+    CREATE OR REPLACE FUNCTION bump_cache_version() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE cache_versions SET version = version + 1 WHERE name = TG_ARGV[0];
+        RETURN NULL;
+    END
+    $$;
+    DROP TRIGGER IF EXISTS tr_tasks_version ON tasks;
+    CREATE TRIGGER tr_tasks_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON tasks
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_version('tasks');
+    DROP TRIGGER IF EXISTS tr_task_assignees_version ON task_assignees;
+    CREATE TRIGGER tr_task_assignees_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON task_assignees
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_version('tasks');
+    DROP TRIGGER IF EXISTS tr_departments_version ON departments;
+    CREATE TRIGGER tr_departments_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON departments
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_version('refs');
+    DROP TRIGGER IF EXISTS tr_statuses_version ON statuses;
+    CREATE TRIGGER tr_statuses_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON statuses
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_version('refs');
+    DROP TRIGGER IF EXISTS tr_users_version ON users;
+    CREATE TRIGGER tr_users_version AFTER INSERT OR DELETE OR TRUNCATE ON users
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_version('refs');
+    DROP FUNCTION IF EXISTS bump_tasks_version();
+    COMMENT ON TABLE cache_versions IS %(schema_version)s;
+'''
+
+@st.cache_resource
 def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # 1. Tasks
-    c.execute('''CREATE TABLE IF NOT EXISTS tasks (
-                    id SERIAL PRIMARY KEY,
-                    task_name TEXT,
-                    department TEXT,
-                    assignee TEXT,
-                    status TEXT,
-                    deadline DATE,
-                    total_items INTEGER,
-                    completed_items INTEGER,
-                    description TEXT, 
-                    file_path TEXT, 
-                    task_link TEXT,
-                    is_archived INTEGER DEFAULT 0
-                )''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                    username TEXT PRIMARY KEY,
-                    password TEXT,
-                    role TEXT,
-                    last_active TIMESTAMP
-                )''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS departments (name TEXT PRIMARY KEY)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS statuses (name TEXT PRIMARY KEY)''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS recurring_templates (
-                    id SERIAL PRIMARY KEY,
-                    task_name TEXT,
-                    department TEXT,
-                    assignee TEXT,
-                    frequency TEXT,
-                    days_of_week TEXT, 
-                    next_run_date DATE,
-                    total_items INTEGER,
-                    description TEXT,
-                    task_link TEXT
-                )''')
-    
-    # Migrations just in case
-    try: c.execute("ALTER TABLE tasks ADD COLUMN description TEXT"); conn.commit()
-    except: conn.rollback()
-    
-    conn.commit()
-    
-    # Seed Data
-    c.execute('SELECT count(*) FROM departments')
-    if c.fetchone()[0] == 0:
-        depts = [("Documentation",), ("HR",), ("Sales",), ("Marketing",), ("Operations",), ("Logstis"), ("Activation")]
-        c.executemany('INSERT INTO departments VALUES (%s)', depts)
-    c.execute('SELECT count(*) FROM statuses')
-    if c.fetchone()[0] == 0:
-        stats = [("Pending",), ("In Progress",), ("Review",), ("Done",)]
-        c.executemany('INSERT INTO statuses VALUES (%s)', stats)
-    conn.commit()
-    conn.close()
+    """Schema setup + seeding; cached so it runs once per server process, not on every rerun"""
+    with db_connection() as conn:
+        c = conn.cursor()
+
+        # 1. One catalog probe; only a fresh/outdated database pays for the DDL, sent as a single batch
+        c.execute("""SELECT (SELECT bool_and(to_regclass(n) IS NOT NULL) FROM unnest(%s::text[]) AS n)
+                        AND (SELECT bool_and(to_regprocedure(f) IS NOT NULL) FROM unnest(%s::text[]) AS f)
+                        AND obj_description(to_regclass('cache_versions'), 'pg_class') IS NOT DISTINCT FROM %s""",
+                  (SCHEMA_RELATIONS, SCHEMA_FUNCTIONS, SCHEMA_VERSION))
+        # A current, stamped schema was seeded when it was created, so that probe is the only query
+        if c.fetchone()[0]: return True
+        # DDL + seeds in one transaction (committed by db_connection)
+        c.execute(SCHEMA_DDL, {"schema_version": SCHEMA_VERSION})
+
+        # Seed Data
+        # Presence probes: one-row LIMIT instead of a count(*) aggregate
+        c.execute('SELECT 1 FROM departments LIMIT 1')
+        if c.fetchone() is None:
+            # One multi-row INSERT per table (executemany would send a statement per row)
+            depts = [("Documentation",), ("HR",), ("Sales",), ("Marketing",), ("Operations",), ("Logstis",), ("Activation",)]
+            execute_values(c, 'INSERT INTO departments (name) VALUES %s', depts)
+        c.execute('SELECT 1 FROM statuses LIMIT 1')
+        if c.fetchone() is None:
+            stats = [("Pending",), ("In Progress",), ("Review",), ("Done",)]
+            execute_values(c, 'INSERT INTO statuses (name) VALUES %s', stats)
+    return True
 
 # --- RECURRING TASK PROCESSOR ---
-def process_recurring_tasks():
-    conn = get_db_connection()
-    c = conn.cursor()
-    today = date.today()
-    
-    # 1. We SELECT specific columns so we know exactly which index corresponds to what
-    #    Order: 0:id, 1:task_name, 2:department, 3:assignee, 4:frequency, 
-    #           5:days_of_week, 6:next_run_date, 7:total_items, 8:description, 9:task_link
-    c.execute("""
-        SELECT id, task_name, department, assignee, frequency, 
-               days_of_week, next_run_date, total_items, description, task_link 
-        FROM recurring_templates 
-        WHERE next_run_date <= %s
-    """, (today,))
-    
-    due_templates = c.fetchall()
-    tasks_created = 0
-    
-    for row in due_templates:
-        # 2. Unpack the tuple explicitly (Safest Method)
-        t_id = row[0]
-        t_name = row[1]
-        t_dept = row[2]
-        t_assignee = row[3]
-        t_freq = row[4]
-        t_days = row[5]
-        t_next_run = row[6]
-        t_total = row[7]
-        t_desc = row[8]
-        t_link = row[9]
-        
-        # 3. Create the new task using these variables
-        c.execute('''INSERT INTO tasks 
-                     (task_name, department, assignee, status, deadline, total_items, completed_items, is_archived, description, task_link) 
-                     VALUES (%s, %s, %s, %s, %s, %s, 0, 0, %s, %s)''', 
-                     (t_name, t_dept, t_assignee, "Pending", t_next_run, t_total, t_desc, t_link))
-        
-        # 4. Calculate the NEW date
-        new_date = get_next_schedule_date(t_next_run, t_freq, t_days)
-
-        # 5. Update the template using the explicit 't_id'
-        c.execute("UPDATE recurring_templates SET next_run_date = %s WHERE id = %s", (new_date, t_id))
-        tasks_created += 1
-
-    conn.commit()
-    conn.close()
-    
-    if tasks_created > 0:
-        get_tasks.clear()
-        return tasks_created
-    return 0
+def process_recurring_tasks(c, today):
+    """Runs on the caller's cursor/transaction; returns how many tasks were generated"""
+    # Entirely set-based: one statement advances every due template, creates its task and the
+    # task's assignee rows, so nothing is shipped to Python regardless of how many are due.
+    c.execute('''
+        WITH due AS (
+            UPDATE recurring_templates r
+            SET next_run_date = next_schedule_date(d.next_run_date, d.frequency, d.days_of_week)
+            FROM recurring_templates d
+            WHERE d.id = r.id AND d.next_run_date <= %s
+              AND (d.end_date IS NULL OR d.next_run_date <= d.end_date)
+            RETURNING r.task_name, r.department, r.assignee, d.next_run_date AS run_date,
+                      r.total_items, r.description, r.task_link
+        ), created AS (
+            INSERT INTO tasks
+                (task_name, department, assignee, status, deadline, total_items, completed_items, is_archived, description, task_link)
+            SELECT task_name, department, assignee, 'Pending', run_date, total_items, 0, 0, description, task_link
+            FROM due
+            RETURNING id, assignee
+        ), linked AS (
+            INSERT INTO task_assignees (task_id, username)
+            SELECT DISTINCT t.id, btrim(a.name)
+            FROM created t, unnest(string_to_array(t.assignee, ',')) AS a(name)
+            WHERE btrim(a.name) <> ''
+            ON CONFLICT DO NOTHING
+        )
+        SELECT count(*) FROM created''', (today,))
+    return c.fetchone()[0]
+
+DAILY_JOBS_LOCK = 4201  # arbitrary app-wide advisory lock key
+
+@st.cache_resource(max_entries=1)
+def run_daily_jobs(day):
+    """Recurring generation + auto-archive, once per process per calendar day (the day is the cache key)"""
+    new_recurr = 0
+    # Both jobs share one pooled connection and commit once
+    with db_cursor() as c:
+        # Other server processes run this too: serialize on a transaction-scoped advisory lock, so the
+        # runner that waited finds nothing left due instead of racing the first one into duplicate tasks
+        c.execute("SELECT pg_advisory_xact_lock(%s)", (DAILY_JOBS_LOCK,))
+        # Every pass advances each due template by at least a day, so this catches up missed runs and terminates
+        while (created := process_recurring_tasks(c, day)) > 0: new_recurr += created
+        archived = run_auto_archive(c, day)
+    if new_recurr or archived: clear_task_caches()
+    return new_recurr, archived
 
 # --- CORE FUNCTIONS ---
-def run_auto_archive():
-    conn = get_db_connection(); c = conn.cursor()
-    cutoff_date = date.today() - timedelta(days=2)
+def save_task_assignees(c, tasks):
+    """Writes task_assignees rows for [(task_id, names), ...] on the caller's cursor in one statement"""
+    rows = list({(task_id, n.strip()) for task_id, names in tasks for n in names if n and n.strip()})
+    if rows: execute_values(c, 'INSERT INTO task_assignees (task_id, username) VALUES %s ON CONFLICT DO NOTHING', rows)
+
+def run_auto_archive(c, today):
+    """Runs on the caller's cursor/transaction; returns how many tasks were archived"""
+    cutoff_date = today - timedelta(days=2)
     c.execute("UPDATE tasks SET is_archived = 1 WHERE status = 'Done' AND deadline < %s AND is_archived = 0", (cutoff_date,))
-    count = c.rowcount; conn.commit(); conn.close()
-    return count
+    return c.rowcount
 
 def delete_task(task_id):
-    conn = get_db_connection(); c = conn.cursor()
-    c.execute("DELETE FROM tasks WHERE id = %s", (task_id,))
-    conn.commit(); conn.close()
-    get_tasks.clear()
-
-def get_list(table_name):
-    conn = get_db_connection(); c = conn.cursor()
-    c.execute(f'SELECT name FROM {table_name}')
-    return [item[0] for item in c.fetchall()]
-
-def add_item(table_name, value):
-    conn = get_db_connection(); c = conn.cursor()
-    try: 
-        c.execute(f'INSERT INTO {table_name} (name) VALUES (%s)', (value,))
-        conn.commit(); success=True
-    except: success=False
-    conn.close(); return success
-
-def delete_item(table_name, value):
-    conn = get_db_connection(); c = conn.cursor()
-    c.execute(f'DELETE FROM {table_name} WHERE name = %s', (value,)); conn.commit(); conn.close()
+    with db_cursor() as c:
+        execute_prepared(c, "delete_task", (task_id,))
+    clear_task_caches()
+
+# Lookup-table statements; the table name is quoted as an identifier instead of f-string interpolated
+LIST_SELECT = sql.SQL("SELECT name FROM {}")
+LIST_INSERT = sql.SQL("INSERT INTO {} (name) VALUES %s ON CONFLICT (name) DO NOTHING RETURNING name")
+LIST_DELETE_MANY = sql.SQL("DELETE FROM {} WHERE name = ANY(%s)")
+# Only these tables are editable lists; statements are composed once here instead of on every call
+LIST_STATEMENTS = {table: {op: stmt.format(sql.Identifier(table))
+                           for op, stmt in (("select", LIST_SELECT), ("insert", LIST_INSERT),
+                                             ("delete_many", LIST_DELETE_MANY))}
+                   for table in ("departments", "statuses")}
+
+def list_statement(table_name, op):
+    if table_name not in LIST_STATEMENTS: raise ValueError(f"Unknown list table: {table_name}")
+    return LIST_STATEMENTS[table_name][op]
+
+@st.cache_data(max_entries=16)
+def get_list(table_name, version=0):
+    with db_cursor() as c:
+        c.execute(list_statement(table_name, "select"))
+        return [item[0] for item in c.fetchall()]
+
+def add_items(table_name, values):
+    """Adds every new, non-blank name in one statement; returns how many were actually inserted"""
+    rows = [(v,) for v in dict.fromkeys(str(v).strip() for v in values) if v]
+    if not rows: return 0
+    # ON CONFLICT keeps the pooled connection out of the aborted-transaction path on duplicates
+    with db_cursor() as c:
+        added = len(execute_values(c, list_statement(table_name, "insert"), rows, fetch=True))
+    if added: get_list.clear()
+    return added
+
+def delete_items(table_name, values):
+    # One statement for the whole selection (executemany would still send one DELETE per name)
+    with db_cursor() as c:
+        c.execute(list_statement(table_name, "delete_many"), (list(values),))
+    get_list.clear()
 
 def create_user(username, password, role="Employee"):
-    conn = get_db_connection(); c = conn.cursor()
-    try: 
-        c.execute('INSERT INTO users(username, password, role) VALUES (%s, %s, %s)', 
+    with db_cursor() as c:
+        c.execute('''INSERT INTO users(username, password, role) VALUES (%s, %s, %s)
+                     ON CONFLICT (username) DO NOTHING RETURNING username''',
                   (username, make_hashes(password), role))
-        conn.commit(); success=True
-    except psycopg2.IntegrityError: 
-        success=False
-    conn.close(); return success
+        success = c.fetchone() is not None
+    if success: get_all_users_list.clear()
+    return success
 
-def delete_user(username):
-    conn = get_db_connection(); c = conn.cursor()
-    c.execute('DELETE FROM users WHERE username = %s', (username,)); conn.commit(); conn.close()
+def delete_users(usernames):
+    with db_cursor() as c:
+        c.execute('DELETE FROM users WHERE username = ANY(%s)', (list(usernames),))
+    get_all_users_list.clear()
 
 def login_user(username, password):
-    conn = get_db_connection(); c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE username = %s AND password = %s', 
-              (username, make_hashes(password)))
-    data = c.fetchall(); conn.close(); return data
-
-def get_all_users_list():
-    conn = get_db_connection(); c = conn.cursor()
-    c.execute('SELECT username FROM users'); return [u[0] for u in c.fetchall()]
-
-def update_last_active(username):
-    conn = get_db_connection(); c = conn.cursor(); now = datetime.now()
-    c.execute("UPDATE users SET last_active = %s WHERE username = %s", (now, username))
-    conn.commit(); conn.close()
-
-def get_online_users():
-    conn = get_db_connection(); c = conn.cursor()
-    limit = datetime.now() - timedelta(minutes=5)
-    c.execute("SELECT username FROM users WHERE last_active > %s", (limit,))
-    return [u[0] for u in c.fetchall()]
+    with db_cursor() as c:
+        execute_prepared(c, "user_by_name", (username,))
+        row = c.fetchone()
+        if not row:
+            check_hashes(password, get_dummy_hash()); return []
+        if not check_hashes(password, row[1]): return []
+        # Salted hashes can't be matched in a WHERE clause, so verify first, then stamp last_active (and
+        # upgrade legacy SHA-256 / outdated Argon2 parameters) in one UPDATE on the same transaction
+        new_hash = make_hashes(password) if needs_rehash(row[1]) else None
+        execute_prepared(c, "touch_user", (datetime.now(), new_hash, username))
+        return [row]
+
+@st.cache_data(max_entries=16)
+def get_all_users_list(version=0):
+    with db_cursor() as c:
+        c.execute('SELECT username FROM users'); return [u[0] for u in c.fetchall()]
+
+def heartbeat_due():
+    # Debounced: the online window is 5 minutes, so a heartbeat every 30 s per session is enough
+    last = st.session_state.get('last_active_write', 0)
+    if time.time() - last < 30: return False
+    st.session_state['last_active_write'] = time.time()
+    return True
+
+def get_session_bundle(username):
+    """Per-rerun live state in one round-trip: the (debounced) last_active heartbeat for username,
+    online users and the cache versions. Returns (online_users, dept_list, status_list, users_list,
+    tasks_version); the lists come from caches keyed on the 'refs' version, so they only hit the
+    database after a change."""
+    now = datetime.now()
+    calls = [("session_state", (now - timedelta(minutes=5),))]
+    if heartbeat_due(): calls.insert(0, ("touch_user", (now, None, username)))
+    with db_cursor() as c:
+        # Only the heartbeat writes here, and a lost one only delays someone showing as online,
+        # so the commit doesn't wait on the fsync
+        execute_prepared_many(c, calls, async_commit=len(calls) > 1)
+        online_users, tasks_version, refs_version = c.fetchone()
+    return (online_users, get_list('departments', refs_version), get_list('statuses', refs_version),
+            get_all_users_list(refs_version), tasks_version)
 
 # --- ADD TASK WITH CLOUD UPLOAD ---
-def add_task(task_name, department, assignee_list, status, deadline, total, completed, frequency="Once", days_list=None, task_link="", description="", uploaded_file=None):
-    # 1. Upload File to Supabase (if exists)
-    file_url = None
-    if uploaded_file:
-        file_url = upload_file_to_supabase(uploaded_file)
-    
-    conn = get_db_connection(); c = conn.cursor()
-    
-    if isinstance(assignee_list, list): assignee_str = ",".join(assignee_list)
-    else: assignee_str = str(assignee_list)
+def add_task(task_name, department, assignee_list, status, deadline, total, completed, frequency="Once", days_list=None, task_link="", description="", uploaded_file=None, end_date=None):
+    if not isinstance(assignee_list, list): assignee_list = str(assignee_list).split(',')
+    assignee_str = ",".join(assignee_list)
     days_str = ",".join(days_list) if days_list else None
-    
-    # 2. Insert into DB (file_path is now file_url)
-    c.execute('''INSERT INTO tasks 
-                 (task_name, department, assignee, status, deadline, total_items, completed_items, is_archived, description, task_link, file_path) 
-                 VALUES (%s, %s, %s, %s, %s, %s, %s, 0, %s, %s, %s)''', 
-                 (task_name, department, assignee_str, status, deadline, total, completed, description, task_link, file_url))
-    
-    if frequency != "Once":
-        next_run = get_next_schedule_date(deadline, frequency, days_str)
-        c.execute('''INSERT INTO recurring_templates 
-                     (task_name, department, assignee, frequency, days_of_week, next_run_date, total_items, description, task_link)
-                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                     (task_name, department, assignee_str, frequency, days_str, next_run, total, description, task_link))
 
-    conn.commit(); conn.close()
-    get_tasks.clear()
+    with db_cursor() as c:
+        # 1. Insert into DB; file_path is filled in by the background upload once it finishes
+        c.execute('''INSERT INTO tasks
+                     (task_name, department, assignee, status, deadline, total_items, completed_items, is_archived, description, task_link)
+                     VALUES (%s, %s, %s, %s, %s, %s, %s, 0, %s, %s) RETURNING id''',
+                     (task_name, department, assignee_str, status, deadline, total, completed, description, task_link))
+        task_id = c.fetchone()[0]
+        save_task_assignees(c, [(task_id, assignee_list)])
+
+        if frequency != "Once":
+            c.execute('''INSERT INTO recurring_templates 
+                         (task_name, department, assignee, frequency, days_of_week, next_run_date, total_items, description, task_link, end_date)
+                         VALUES (%s, %s, %s, %s, %s, next_schedule_date(%s, %s, %s), %s, %s, %s, %s)''',
+                         (task_name, department, assignee_str, frequency, days_str,
+                          deadline, frequency, days_str, total, description, task_link, end_date))
+
+    # 2. Upload File to Supabase (if exists) only after the row is committed, so the UPDATE can find it
+    if uploaded_file: attach_file_later(task_id, uploaded_file)
+    clear_task_caches()
 
 # --- UPDATE TASK WITH CLOUD UPLOAD ---
 def update_task_details(task_id, new_status, new_completed, new_link, new_desc, new_uploaded_file=None):
-    # 1. Upload new file if provided
-    new_file_url = None
-    if new_uploaded_file:
-        new_file_url = upload_file_to_supabase(new_uploaded_file)
-        
-    conn = get_db_connection(); c = conn.cursor()
-    query = "UPDATE tasks SET status = %s, completed_items = %s, description = %s"
-    params = [new_status, new_completed, new_desc]
-    
-    # Only update file_path if a new file was uploaded
-    if new_file_url: 
-        query += ", file_path = %s"
-        params.append(new_file_url)
-        
-    if new_link: 
-        query += ", task_link = %s"
-        params.append(new_link)
-    
-    query += " WHERE id = %s"; params.append(task_id)
-    c.execute(query, tuple(params)); conn.commit(); conn.close()
-    get_tasks.clear()
-
-def render_metrics(df):
-    today = date.today()
-    df['deadline'] = pd.to_datetime(df['deadline']).dt.date
-    df['is_overdue'] = (df['deadline'] < today) & (df['status'] != 'Done')
+    # One fixed statement: an empty link keeps the stored one via COALESCE instead of a different SQL text
+    with db_cursor() as c:
+        execute_prepared(c, "update_task", (new_status, new_completed, new_desc, new_link or None, task_id))
+    # New file (if provided) replaces file_path in the background once its upload finishes
+    if new_uploaded_file: attach_file_later(task_id, new_uploaded_file)
+    clear_task_caches()
+
+def update_task_progress(rows):
+    """Status/completed edits from the table view, [(id, status, completed), ...], in one statement"""
+    with db_cursor() as c:
+        # Casts keep the VALUES columns typed even when every row carries the same kind of value; completed
+        # is clamped to [0, total_items] like the Update dialog, and a missing status keeps the stored one
+        execute_values(c, """UPDATE tasks t SET status = COALESCE(v.status::text, t.status),
+                                 completed_items = LEAST(GREATEST(v.completed::int, 0), COALESCE(t.total_items, v.completed::int))
+                             FROM (VALUES %s) AS v(id, status, completed)
+                             WHERE t.id = v.id::int AND v.completed IS NOT NULL""", rows)
+    clear_task_caches()
+
+def render_metrics(counts):
+    """Metric row from get_task_counts; the status counts cover every task, so no rows are needed"""
+    total = int(counts['status'].sum()); done = int(counts['status'].get('Done', 0))
     m1, m2, m3, m4 = st.columns(4)
-    m1.metric("Active Tasks", len(df)); m2.metric("Completed", len(df[df['status'] == 'Done']))
-    m3.metric("Pending", len(df[df['status'] != 'Done'])); m4.metric("Overdue 🚨", len(df[df['is_overdue'] == True]))
+    m1.metric("Active Tasks", total); m2.metric("Completed", done)
+    m3.metric("Pending", total - done); m4.metric("Overdue 🚨", int(counts['overdue'].sum()))
     st.markdown("---")
 
+IMAGE_EXTS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.webp'})
+
 def display_attachment_preview(file_url, link_url):
     """Displays cloud files or links"""
     if link_url: st.markdown(f"🔗 **Link:** [{link_url}]({link_url})")
@@ -348,9 +665,39 @@ def display_attachment_preview(file_url, link_url):
     # If we have a file_url (from Supabase), display it
     if file_url:
         st.markdown(f"📎 **Attached File:** [Download]({file_url})")
-        # Try to preview images
-        if any(ext in str(file_url).lower() for ext in ['.png', '.jpg', '.jpeg', '.gif']):
-            st.image(file_url, width=200)
+        # Try to preview images; collapsed so a board full of cards doesn't pull every image up front.
+        # Extension of the URL path only, so a query string or a ".png" elsewhere in the URL doesn't count
+        if os.path.splitext(urlparse(str(file_url)).path)[1].lower() in IMAGE_EXTS:
+            with st.expander("🖼️ Preview"): st.image(file_url, width=200)
+
+def bulk_delete_editor(label, names, key):
+    """One data_editor with a Delete checkbox column instead of a button per item; returns the ticked names"""
+    # Key on the contents so a stale selection never carries over once the list changes
+    edited = st.data_editor(pd.DataFrame({label: names, "Delete": [False] * len(names)}),
+                            key=f"{key}_{hash(tuple(names))}", hide_index=True, disabled=[label], use_container_width=True)
+    return edited.loc[edited["Delete"], label].tolist()
+
+def task_table_editor(work_df, status_list, key):
+    """The workspace page as one data_editor (status/progress editable) instead of a card + buttons per task"""
+    cols = ['id', 'task_name', 'department', 'status', 'completed_items', 'total_items']
+    options = list(dict.fromkeys(status_list + work_df['status'].dropna().tolist()))
+    edited = st.data_editor(work_df[cols], key=key, hide_index=True, use_container_width=True,
+                            disabled=['id', 'task_name', 'department', 'total_items'],
+                            column_config={"status": st.column_config.SelectboxColumn("status", options=options, required=True),
+                                           "completed_items": st.column_config.NumberColumn("completed_items", min_value=0, step=1,
+                                                                                            required=True)})
+    before, after = work_df.set_index('id')[cols[3:5]], edited.set_index('id')[cols[3:5]]
+    changed = after[(before.ne(after) & ~(before.isna() & after.isna())).any(axis=1)]
+    # Same bounds as the Update dialog: a value and at most total_items
+    totals = work_df.set_index('id')['total_items'].reindex(changed.index)
+    invalid = changed['status'].isna() | changed['completed_items'].isna() | (changed['completed_items'] > totals.fillna(float('inf')))
+    if invalid.any():
+        st.warning(f"{int(invalid.sum())} row(s) need a status and 0 to total items completed; they won't be saved.")
+    valid = changed[~invalid]
+    if st.button(f"💾 Save {len(valid)} change(s)", type="primary", disabled=valid.empty):
+        update_task_progress([(int(i), r.status, int(r.completed_items))
+                              for i, r in zip(valid.index, valid.itertuples(index=False))])
+        st.success("Updated!"); st.rerun()
 
 # --- DIALOGS ---
 @st.dialog("Confirm Deletion")
@@ -363,12 +710,13 @@ def dialog_confirm_delete(item_type, item_name, delete_func, *args):
         st.success("Deleted!"); st.rerun()
 
 @st.dialog("Confirm Task Creation")
-def dialog_confirm_add(t_name, t_dept, t_assignee, t_status, t_deadline, t_total, t_completed, t_freq, t_days, t_link, t_desc, t_file):
+def dialog_confirm_add(t_name, t_dept, t_assignee, t_status, t_deadline, t_total, t_completed, t_freq, t_days, t_link, t_desc, t_file, t_end=None):
     st.write("Review Details:")
     st.markdown(f"**Task:** {t_name}")
     st.markdown(f"**Assignee:** {t_assignee}")
     freq_msg = t_freq
     if t_freq == "Specific Days" and t_days: freq_msg = f"{t_freq} ({', '.join(t_days)})"
+    if t_freq != "Once" and t_end: freq_msg += f" until {t_end}"
     st.markdown(f"**Frequency:** {freq_msg}")
     
     if t_file: st.markdown(f"**Attachment:** {t_file.name}")
@@ -378,18 +726,22 @@ def dialog_confirm_add(t_name, t_dept, t_assignee, t_status, t_deadline, t_total
     st.divider()
     if st.button("Confirm & Create", type="primary", use_container_width=True):
         with st.spinner("Uploading & Saving..."):
-             add_task(t_name, t_dept, t_assignee, t_status, t_deadline, t_total, t_completed, t_freq, t_days, t_link, t_desc, t_file)
+             add_task(t_name, t_dept, t_assignee, t_status, t_deadline, t_total, t_completed, t_freq, t_days, t_link, t_desc, t_file, t_end)
         st.success("Created!"); st.rerun()
 
 @st.dialog("Update Task Details")
 def update_task_dialog(row, status_list):
     st.write(f"Editing: **{row['task_name']}**")
     c1, c2 = st.columns(2)
-    new_comp = c1.number_input("Items Completed", 0, row['total_items'], row['completed_items'])
+    # Plain ints within bounds: a NULL anywhere on the page makes these columns float64, and
+    # number_input rejects mixed numeric types or a value above max_value
+    total = int(row['total_items']) if pd.notna(row['total_items']) else 0
+    done = min(int(row['completed_items']) if pd.notna(row['completed_items']) else 0, total)
+    new_comp = c1.number_input("Items Completed", 0, total, done)
     current_status_list = status_list.copy()
     if row['status'] not in current_status_list: current_status_list.append(row['status'])
     new_stat = c2.selectbox("Status", current_status_list, index=current_status_list.index(row['status']))
-    st.progress(int((new_comp/row['total_items'])*100) if row['total_items']>0 else 0)
+    st.progress(int((new_comp/total)*100) if total > 0 else 0)
     
     st.markdown("---")
     current_desc = row['description'] if row['description'] else ""
@@ -422,9 +774,15 @@ def main():
     st.set_page_config(page_title="Lynx Tracker", layout="wide", page_icon="🔐")
     init_db()
 
-    new_recurr = process_recurring_tasks()
-    if new_recurr > 0: st.toast(f"🔄 Generated {new_recurr} recurring tasks!")
-    if run_auto_archive() > 0: st.toast("🧹 Auto-Archived.")
+    today = date.today()
+    new_recurr, archived = run_daily_jobs(today)
+    # The jobs' result is cached for the day, so only toast it once per session
+    if st.session_state.get('jobs_toasted') != today:
+        st.session_state['jobs_toasted'] = today
+        if new_recurr > 0: st.toast(f"🔄 Generated {new_recurr} recurring tasks!")
+        if archived > 0: st.toast("🧹 Auto-Archived.")
+
+    toast_upload_failures()
 
     if 'logged_in' not in st.session_state:
         st.session_state['logged_in'] = False; st.session_state['username'] = None; st.session_state['role'] = None
@@ -440,7 +798,7 @@ def main():
                     with st.spinner("Verifying..."):
                         res = login_user(u, p); 
                         if not res: time.sleep(0.5)
-                    if res: st.session_state['logged_in']=True; st.session_state['username']=u; st.session_state['role']=res[0][2]; update_last_active(u); st.rerun()
+                    if res: st.session_state['logged_in']=True; st.session_state['username']=u; st.session_state['role']=res[0][2]; st.session_state['last_active_write']=time.time(); st.rerun()
                     else: st.error("Invalid Creds")
             with tab_signup:
                 nu = st.text_input("New User"); np = st.text_input("New Pass", type='password'); nr = st.selectbox("Role", ["Employee", "Manager"])
@@ -450,11 +808,7 @@ def main():
                         else: st.warning("Exists.")
 
     else:
-        update_last_active(st.session_state['username'])
-        online_users = get_online_users()
-        dept_list = get_list('departments')
-        status_list = get_list('statuses')
-        users_list = get_all_users_list()
+        online_users, dept_list, status_list, users_list, tasks_version = get_session_bundle(st.session_state['username'])
 
         st.sidebar.write(f"👤 **{st.session_state['username']}** ({st.session_state['role']})")
         st.sidebar.markdown("**Online:**"); 
@@ -473,6 +827,7 @@ def main():
         days_selected = []
         if freq == "Specific Days":
             days_selected = st.sidebar.multiselect("Select Days", ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])
+        t_end = st.sidebar.date_input("Repeat Until (optional)", value=None) if freq != "Once" else None
         ts = st.sidebar.selectbox("Status", status_list if status_list else ["Pending"])
         tdl = st.sidebar.date_input("Deadline")
         t_desc = st.sidebar.text_area("Description / Instructions")
@@ -482,103 +837,113 @@ def main():
         t_file = st.sidebar.file_uploader("Attach File (Permanent Cloud)")
 
         if st.sidebar.button("Add Task", type="primary"):
-            dialog_confirm_add(tn, td, ta, ts, tdl, tt, tc, freq, days_selected, t_link, t_desc, t_file)
+            dialog_confirm_add(tn, td, ta, ts, tdl, tt, tc, freq, days_selected, t_link, t_desc, t_file, t_end)
 
+        # Role is fixed for the rerun: check it once here, not per rendered card
+        is_manager = st.session_state['role'] == "Manager"
         show_archived = False
-        if st.session_state['role'] == "Manager": show_archived = st.sidebar.checkbox("Show Archived")
-        df = get_tasks(show_archived)
-        
+        if is_manager: show_archived = st.sidebar.checkbox("Show Archived")
+        # Employees only ever see their own tasks; the filter runs in SQL against task_assignees
+        my_filter = st.session_state['username'] if st.session_state['role'] == "Employee" else None
+        # Metrics, charts and paging counts for this view; individual rows are only fetched as pages
+        counts = get_task_counts(show_archived, my_filter, tasks_version, today)
+
         st.title("📊 Lynx Task Tracker")
         tabs = ["📈 Dashboard", "👤 My Workspace"]
-        if st.session_state['role'] == "Manager": tabs.append("🛠️ Admin")
+        if is_manager: tabs.append("🛠️ Admin")
         current_tab = st.tabs(tabs)
 
         with current_tab[0]:
-            dash_df = df.copy()
-            if st.session_state['role'] == "Employee":
-                dash_df = df[df['assignee'].astype(str).apply(lambda x: st.session_state['username'] in [a.strip() for a in x.split(',')])]
-
-            if not dash_df.empty:
-                render_metrics(dash_df)
+            if not counts['status'].empty:
+                render_metrics(counts)
+                # Metrics, charts and the list are pushed down to SQL: O(groups) and O(limit) rows over the wire
                 c1, c2, c3 = st.columns(3)
-                c1.subheader("By Dept"); c1.bar_chart(dash_df['department'].value_counts())
-                c2.subheader("By Status"); c2.bar_chart(dash_df['status'].value_counts())
+                c1.subheader("By Dept"); c1.bar_chart(counts['department'])
+                c2.subheader("By Status"); c2.bar_chart(counts['status'])
                 c3.subheader("By Employee")
-                try:
-                    chart_df = dash_df.assign(assignee=dash_df['assignee'].str.split(',')).explode('assignee')
-                    chart_df['assignee'] = chart_df['assignee'].str.strip()
-                    c3.bar_chart(chart_df['assignee'].value_counts())
-                except: st.caption("No data")
+                if not counts['assignee'].empty: c3.bar_chart(counts['assignee'])
+                else: c3.caption("No data")
                 st.markdown("### 📄 List")
                 lim = st.selectbox("Show:", [10, 20, 50, "All"])
-                d_df = dash_df.head(int(lim)) if lim != "All" else dash_df
-                st.dataframe(d_df[['task_name', 'department', 'status', 'deadline', 'completed_items']], use_container_width=True)
+                d_df = get_tasks(show_archived, my_filter, None if lim == "All" else int(lim), tasks_version,
+                                 columns=DASHBOARD_COLUMNS)
+                st.dataframe(d_df, use_container_width=True,
+                             column_config={"deadline": st.column_config.DateColumn("deadline")})
             else: st.info("No tasks.")
 
         with current_tab[1]:
             st.header("Active Tasks")
             selected_statuses = st.multiselect("Filter by Status:", options=status_list, default=status_list)
             
-            work_df = df.copy()
-            if st.session_state['role'] == "Employee":
-                work_df = work_df[work_df['assignee'].astype(str).apply(lambda x: st.session_state['username'] in [a.strip() for a in x.split(',')])]
-            
-            if selected_statuses: work_df = work_df[work_df['status'].isin(selected_statuses)]
-            else: work_df = work_df[0:0] 
-
-            if not work_df.empty:
-                for dept in work_df['department'].unique():
+            # Status filter and paging run in SQL; the page count comes from the cached per-status counts
+            total = int(counts['status'].reindex(selected_statuses).fillna(0).sum())
+            n_pages = max(1, -(-total // WORKSPACE_PAGE_SIZE))
+            page = st.selectbox(f"Page (of {n_pages}):", list(range(1, n_pages + 1))) if n_pages > 1 else 1
+            table_view = st.toggle("Table view (quick status/progress edits)")
+            if selected_statuses:
+                work_df = get_tasks(show_archived, my_filter, WORKSPACE_PAGE_SIZE, tasks_version,
+                                    tuple(selected_statuses), (page - 1) * WORKSPACE_PAGE_SIZE)
+            else: work_df = pd.DataFrame(columns=TASK_COLUMNS)
+
+            if not work_df.empty and table_view:
+                # Keyed on the rows shown + tasks version so pending edits never carry over to different data
+                task_table_editor(work_df, status_list, key=f"task_editor_{tasks_version}_{hash(tuple(work_df['id']))}")
+            elif not work_df.empty:
+                # One hash partition instead of a boolean mask per department; sort=False keeps first-seen order
+                for dept, dept_df in work_df.groupby('department', sort=False):
                     st.markdown(f"### 📂 {dept}")
                     st.markdown("---")
-                    for idx, row in work_df[work_df['department'] == dept].iterrows():
+                    # itertuples yields lightweight namedtuples: no pd.Series or dict built per card
+                    for row in dept_df.itertuples(index=False):
                         with st.container(border=True):
                             c_info, c_stat, c_act = st.columns([3, 2, 1])
                             with c_info:
-                                st.subheader(row['task_name'])
-                                st.caption(f"📅 Due: {row['deadline']}")
-                                assignees = str(row['assignee']).replace(",", ", ")
+                                st.subheader(row.task_name)
+                                st.caption(f"📅 Due: {row.deadline.date() if pd.notna(row.deadline) else '—'}")
+                                assignees = str(row.assignee).replace(",", ", ")
                                 st.markdown(f"**👤 Assigned:** `{assignees}`")
-                                if row['description']:
-                                    with st.expander("📄 View Description/Report"): st.write(row['description'])
-                                display_attachment_preview(row['file_path'], row['task_link'])
+                                if row.description:
+                                    with st.expander("📄 View Description/Report"): st.write(row.description)
+                                display_attachment_preview(row.file_path, row.task_link)
                             with c_stat:
-                                st.write(f"**Status:** {row['status']}")
-                                prog = int((row['completed_items']/row['total_items'])*100) if row['total_items']>0 else 0
-                                st.progress(prog)
-                                st.caption(f"{row['completed_items']} / {row['total_items']} items")
+                                st.write(f"**Status:** {row.status}")
+                                st.progress(row.progress)
+                                st.caption(f"{row.completed_items} / {row.total_items} items")
                             with c_act:
-                                if st.button("✏️ Update", key=f"upd_{row['id']}", use_container_width=True):
-                                    update_task_dialog(row, status_list)
-                                if st.session_state['role'] == "Manager":
-                                    if st.button("🗑️ Delete", key=f"del_{row['id']}", type="primary", use_container_width=True):
-                                        dialog_confirm_delete("Task", row['task_name'], delete_task, row['id'])
+                                if st.button("✏️ Update", key=f"upd_{row.id}", use_container_width=True):
+                                    update_task_dialog(row._asdict(), status_list)
+                                if is_manager:
+                                    if st.button("🗑️ Delete", key=f"del_{row.id}", type="primary", use_container_width=True):
+                                        dialog_confirm_delete("Task", row.task_name, delete_task, row.id)
                     st.write("")
             else: st.info("No tasks match your filters.")
 
-        if st.session_state['role'] == "Manager":
+        if is_manager:
             with current_tab[2]:
                 st.header("Admin"); ac1, ac2, ac3 = st.columns(3)
                 with ac1:
-                    st.subheader("Depts"); nd = st.text_input("New Dept")
-                    if st.button("Add Dept", type="primary"): 
+                    st.subheader("Depts"); nd = st.text_area("New Depts (one per line)")
+                    if st.button("Add Depts", type="primary"): 
                         with st.spinner("Adding..."):
-                            add_item('departments', nd); st.rerun()
-                    for d in dept_list: 
-                        if st.button(f"Delete {d}", key=f"d_{d}"): dialog_confirm_delete("Department", d, delete_item, 'departments', d)
+                            add_items('departments', nd.splitlines()); st.rerun()
+                    del_depts = bulk_delete_editor("Department", dept_list, "d_edit")
+                    if st.button("Delete Selected", key="d_apply", disabled=not del_depts):
+                        dialog_confirm_delete("Departments", ", ".join(del_depts), delete_items, 'departments', del_depts)
                 with ac2:
-                    st.subheader("Statuses"); ns = st.text_input("New Status")
-                    if st.button("Add Status", type="primary"): 
+                    st.subheader("Statuses"); ns = st.text_area("New Statuses (one per line)")
+                    if st.button("Add Statuses", type="primary"): 
                         with st.spinner("Adding..."):
-                            add_item('statuses', ns); st.rerun()
-                    for s in status_list:
-                         if st.button(f"Delete {s}", key=f"s_{s}"): dialog_confirm_delete("Status", s, delete_item, 'statuses', s)
+                            add_items('statuses', ns.splitlines()); st.rerun()
+                    del_stats = bulk_delete_editor("Status", status_list, "s_edit")
+                    if st.button("Delete Selected", key="s_apply", disabled=not del_stats):
+                        dialog_confirm_delete("Statuses", ", ".join(del_stats), delete_items, 'statuses', del_stats)
                 with ac3:
                     st.subheader("Users")
-                    for u in users_list:
-                        c_a, c_b = st.columns([2,1])
-                        c_a.write(u)
-                        if u != st.session_state['username']:
-                             if c_b.button("🗑️", key=f"u_{u}"): dialog_confirm_delete("User", u, delete_user, u)
+                    st.caption(f"You: {st.session_state['username']}")
+                    other_users = [u for u in users_list if u != st.session_state['username']]
+                    del_users = bulk_delete_editor("User", other_users, "u_edit")
+                    if st.button("Delete Selected", key="u_apply", disabled=not del_users):
+                        dialog_confirm_delete("Users", ", ".join(del_users), delete_users, del_users)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file